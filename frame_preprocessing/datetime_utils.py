@@ -1,24 +1,101 @@
-from datetime import datetime
+import functools
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 
-import pytz
+import numpy as np
 
 
 class DatetimeUtils:
     """
     Class that contains utility functions for datetime operations.
     """
+    # Daylight savings switches are months apart, so at most one can occur in this interval
+    TRANSITION_SEARCH_STEP_S = 24 * 60 * 60
 
     @staticmethod
-    def is_in_daylight_savings(timestamp_s: int, timezone_str: str) -> bool:
-        """
-        Check if the timestamp is in daylight savings time in the given timezone.
-        """
-        date_time = datetime.fromtimestamp(timestamp_s)
-        timezone = pytz.timezone(timezone_str)
-        try:
-            timezone_aware_date = timezone.localize(date_time, is_dst=None)
-            return timezone_aware_date.tzinfo._dst.seconds != 0
-        except pytz.exceptions.AmbiguousTimeError:
-            # This happens in the exact hour when daylight savings switch occurs
-            # We will consider these frames as not in daylight savings
-            return False
+    def get_daylight_savings_flags(timestamps_s: np.ndarray, timezone_str: str) -> np.ndarray:
+        """
+        Check which of the given timestamps are in daylight savings time in the given timezone, all at once.
+
+        The daylight savings switches are located once per year and cached. The switches of all years within
+        the range of the timestamps are merged, after which each timestamp is classified by the number of
+        switches that precede it.
+        """
+        if len(timestamps_s) == 0:
+            return np.zeros(0, dtype=bool)
+
+        first_year = time.localtime(int(timestamps_s.min())).tm_year
+        last_year = time.localtime(int(timestamps_s.max())).tm_year
+        is_first_year_start_in_daylight_savings, _ = DatetimeUtils.__get_year_transitions(first_year, timezone_str)
+        transitions_s = np.asarray(
+            [
+                transition_s
+                for year in range(first_year, last_year + 1)
+                for transition_s in DatetimeUtils.__get_year_transitions(year, timezone_str)[1]
+            ],
+            dtype=np.int64)
+
+        transition_counts = np.searchsorted(transitions_s, timestamps_s, side='right')
+        return (transition_counts % 2 == 1) != is_first_year_start_in_daylight_savings
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __get_year_transitions(year: int, timezone_str: str) -> tuple[bool, tuple[int, ...]]:
+        """
+        Get the daylight savings status at the start of the local year,
+        and the sorted timestamps of the daylight savings switches during the year.
+        """
+        year_start_s = int(datetime(year, 1, 1).timestamp())
+        year_end_s = int(datetime(year + 1, 1, 1).timestamp()) - 1
+        return (
+            DatetimeUtils.__check_daylight_savings(year_start_s, timezone_str),
+            tuple(DatetimeUtils.__get_transitions(year_start_s, year_end_s, timezone_str)))
+
+    @staticmethod
+    def __get_transitions(start_s: int, end_s: int, timezone_str: str) -> list[int]:
+        """
+        Get the sorted timestamps in the (start_s, end_s] range at which the result of
+        the daylight savings check changes, each being the first second with the new status.
+        """
+        transitions_s: list[int] = []
+        step_start_s = start_s
+        is_step_start_in_daylight_savings = DatetimeUtils.__check_daylight_savings(step_start_s, timezone_str)
+        while step_start_s < end_s:
+            step_end_s = min(step_start_s + DatetimeUtils.TRANSITION_SEARCH_STEP_S, end_s)
+            is_step_end_in_daylight_savings = DatetimeUtils.__check_daylight_savings(step_end_s, timezone_str)
+
+            if is_step_start_in_daylight_savings != is_step_end_in_daylight_savings:
+                # Binary search for the exact second of the switch
+                low_s, high_s = step_start_s, step_end_s
+                while high_s - low_s > 1:
+                    middle_s = (low_s + high_s) // 2
+                    if DatetimeUtils.__check_daylight_savings(middle_s, timezone_str) == is_step_start_in_daylight_savings:
+                        low_s = middle_s
+                    else:
+                        high_s = middle_s
+                transitions_s.append(high_s)
+
+            step_start_s = step_end_s
+            is_step_start_in_daylight_savings = is_step_end_in_daylight_savings
+
+        return transitions_s
+
+    @staticmethod
+    def __check_daylight_savings(timestamp_s: int, timezone_str: str) -> bool:
+        """
+        Check if the timestamp is in daylight savings time in the given timezone, directly with the timezone object.
+        """
+        date_time = datetime.fromtimestamp(timestamp_s).replace(tzinfo=DatetimeUtils.__get_timezone(timezone_str))
+        # The wall clock time is ambiguous in the exact hour when daylight savings switch occurs,
+        # in which case the two folds differ. We will consider these frames as not in daylight savings
+        return date_time.dst() != timedelta(0) and date_time.replace(fold=1).dst() != timedelta(0)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __get_timezone(timezone_str: str) -> ZoneInfo:
+        """
+        Get the timezone object for the given timezone name.
+        Cached, as loading the timezone database entry is much more expensive than the DST check itself.
+        """
+        return ZoneInfo(timezone_str)
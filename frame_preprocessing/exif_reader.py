@@ -1,5 +1,8 @@
+import io
+import struct
 from dataclasses import dataclass
 from datetime import datetime
+from typing import BinaryIO
 
 import exifread
 from exifread.exceptions import ExifNotFound
@@ -27,32 +30,221 @@ class ExifReader:
     GPS_LON_REF_TAG = 'GPS GPSLongitudeRef'
     GPS_ALT_TAG = 'GPS GPSAltitude'
 
+    # JPEG images store the EXIF data in the APP1 segment at the start of the file, which is at most 64KiB
+    JPEG_SOI_MARKER = b'\xff\xd8'
+    JPEG_HEADER_SIZE = 128 * 1024
+    JPEG_APP1_MARKER = 0xE1
+    JPEG_SOS_MARKER = 0xDA
+    JPEG_EOI_MARKER = 0xD9
+    JPEG_EXIF_IDENTIFIER = b'Exif\x00\x00'
+
+    # TIFF structure tag ids and value types used when reading the JPEG EXIF data directly
+    TIFF_EXIF_IFD_POINTER_TAG = 0x8769
+    TIFF_GPS_IFD_POINTER_TAG = 0x8825
+    TIFF_DATE_TIME_ORIGINAL_TAG = 0x9003
+    TIFF_GPS_LAT_REF_TAG = 0x0001
+    TIFF_GPS_LAT_TAG = 0x0002
+    TIFF_GPS_LON_REF_TAG = 0x0003
+    TIFF_GPS_LON_TAG = 0x0004
+    TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
     @staticmethod
-    def read_exif_data(image_path: str) -> ExifData:
+    def read_exif_data(image_path: str, need_gps: bool = True) -> ExifData:
         """
         Read EXIF data from an image.
+        GPS data is not parsed if it is not needed, in which case the coordinates are None.
+
+        JPEG images are read directly from the APP1 segment first, which only touches the needed tags.
+        Other formats and JPEG images that cannot be read directly fall back to exifread.
         """
         with open(image_path, 'rb') as image_file:
-            try:
-                exif_data = exifread.process_file(image_file, details=False)
-            except ExifNotFound:
-                exif_data = {}
+            header = image_file.read(ExifReader.JPEG_HEADER_SIZE)
+            if header.startswith(ExifReader.JPEG_SOI_MARKER):
+                exif_data = ExifReader.__read_jpeg_app1(header, need_gps)
+                if exif_data is not None:
+                    return exif_data
+
+            exif_tags = ExifReader.__read_exif_tags(image_file, header)
 
         timestamp_s: int | None = None
-        corresponding_tags = [tag for tag in exif_data.keys() if ExifReader.DATE_TIME_TAG in tag]
+        corresponding_tags = [tag for tag in exif_tags.keys() if ExifReader.DATE_TIME_TAG in tag]
         if len(corresponding_tags) > 0:
             date_time_tag = corresponding_tags[0]
-            date_time_original = exif_data[date_time_tag].values
-            date_time = datetime.strptime(date_time_original, '%Y:%m:%d %H:%M:%S')
-            timestamp_s = int(date_time.timestamp())
+            timestamp_s = ExifReader.__parse_date_time(exif_tags[date_time_tag].values)
 
-        latitude, longitude = ExifReader.__parse_gps_data(exif_data)
+        latitude: float | None = None
+        longitude: float | None = None
+        if need_gps:
+            latitude, longitude = ExifReader.__parse_gps_data(exif_tags)
 
         return ExifData(
             timestamp_s=timestamp_s,
             latitude=latitude,
             longitude=longitude)
 
+    @staticmethod
+    def __read_jpeg_app1(header: bytes, need_gps: bool) -> ExifData | None:
+        """
+        Reads the EXIF data directly from the APP1 segment of a JPEG image header, parsing only the
+        date time and GPS tags. Returns None if the segment or the date time tag is not found, or the
+        data is not in the expected format, in which case the image should be read by exifread instead.
+        """
+        try:
+            # Walk the JPEG segment markers until the APP1 segment with the EXIF identifier
+            offset = len(ExifReader.JPEG_SOI_MARKER)
+            while True:
+                if header[offset] != 0xFF:
+                    return None
+                marker = header[offset + 1]
+                if marker == 0xFF:
+                    # Fill byte before the marker
+                    offset += 1
+                    continue
+                if marker in (ExifReader.JPEG_SOS_MARKER, ExifReader.JPEG_EOI_MARKER):
+                    # Image data is reached without finding the EXIF data
+                    return None
+
+                segment_length = struct.unpack_from('>H', header, offset + 2)[0]
+                segment_start = offset + 4
+                segment_end = offset + 2 + segment_length
+                if marker == ExifReader.JPEG_APP1_MARKER and \
+                        header[segment_start:segment_start + 6] == ExifReader.JPEG_EXIF_IDENTIFIER:
+                    break
+                offset = segment_end
+
+            if segment_end > len(header):
+                return None
+            tiff = memoryview(header)[segment_start + 6:segment_end]
+
+            # TIFF header: byte order, the magic number and the offset of the first IFD
+            if tiff[0:2] == b'II':
+                byte_order = '<'
+            elif tiff[0:2] == b'MM':
+                byte_order = '>'
+            else:
+                return None
+            magic_number, first_ifd_offset = struct.unpack_from(byte_order + 'HI', tiff, 2)
+            if magic_number != 42:
+                return None
+
+            first_ifd = ExifReader.__read_tiff_ifd(tiff, byte_order, first_ifd_offset)
+            if ExifReader.TIFF_EXIF_IFD_POINTER_TAG not in first_ifd:
+                return None
+            exif_ifd_offset = ExifReader.__read_tiff_pointer(tiff, byte_order, first_ifd, ExifReader.TIFF_EXIF_IFD_POINTER_TAG)
+            exif_ifd = ExifReader.__read_tiff_ifd(tiff, byte_order, exif_ifd_offset)
+            if ExifReader.TIFF_DATE_TIME_ORIGINAL_TAG not in exif_ifd:
+                return None
+            timestamp_s = ExifReader.__parse_date_time(
+                ExifReader.__read_tiff_ascii(tiff, exif_ifd, ExifReader.TIFF_DATE_TIME_ORIGINAL_TAG))
+
+            latitude: float | None = None
+            longitude: float | None = None
+            if need_gps and ExifReader.TIFF_GPS_IFD_POINTER_TAG in first_ifd:
+                gps_ifd_offset = ExifReader.__read_tiff_pointer(tiff, byte_order, first_ifd, ExifReader.TIFF_GPS_IFD_POINTER_TAG)
+                gps_ifd = ExifReader.__read_tiff_ifd(tiff, byte_order, gps_ifd_offset)
+                if ExifReader.TIFF_GPS_LAT_TAG in gps_ifd and ExifReader.TIFF_GPS_LAT_REF_TAG in gps_ifd:
+                    latitude = ExifReader.__convert_coordinate(
+                        ExifReader.__read_tiff_rationals(tiff, byte_order, gps_ifd, ExifReader.TIFF_GPS_LAT_TAG),
+                        ExifReader.__read_tiff_ascii(tiff, gps_ifd, ExifReader.TIFF_GPS_LAT_REF_TAG))
+                if ExifReader.TIFF_GPS_LON_TAG in gps_ifd and ExifReader.TIFF_GPS_LON_REF_TAG in gps_ifd:
+                    longitude = ExifReader.__convert_coordinate(
+                        ExifReader.__read_tiff_rationals(tiff, byte_order, gps_ifd, ExifReader.TIFF_GPS_LON_TAG),
+                        ExifReader.__read_tiff_ascii(tiff, gps_ifd, ExifReader.TIFF_GPS_LON_REF_TAG))
+        except (IndexError, ValueError, ZeroDivisionError, struct.error):
+            # Truncated or malformed data
+            return None
+
+        return ExifData(
+            timestamp_s=timestamp_s,
+            latitude=latitude,
+            longitude=longitude)
+
+    @staticmethod
+    def __read_tiff_ifd(tiff: memoryview, byte_order: str, ifd_offset: int) -> dict[int, tuple[int, int, int]]:
+        """
+        Reads the entries of a TIFF IFD and returns a dictionary that maps each
+        tag id to its value type, value count and the offset of the value data.
+        """
+        entries: dict[int, tuple[int, int, int]] = {}
+        entry_count = struct.unpack_from(byte_order + 'H', tiff, ifd_offset)[0]
+        for entry_offset in range(ifd_offset + 2, ifd_offset + 2 + 12 * entry_count, 12):
+            tag, value_type, value_count = struct.unpack_from(byte_order + 'HHI', tiff, entry_offset)
+            value_size = ExifReader.TIFF_TYPE_SIZES.get(value_type, 1) * value_count
+            # Values of up to 4 bytes are stored in the entry itself, otherwise the entry holds their offset
+            if value_size <= 4:
+                value_offset = entry_offset + 8
+            else:
+                value_offset = struct.unpack_from(byte_order + 'I', tiff, entry_offset + 8)[0]
+            entries[tag] = (value_type, value_count, value_offset)
+
+        return entries
+
+    @staticmethod
+    def __read_tiff_pointer(tiff: memoryview, byte_order: str, ifd: dict[int, tuple[int, int, int]], tag: int) -> int:
+        """
+        Reads the offset of a sub-IFD from the given IFD.
+        """
+        _, _, value_offset = ifd[tag]
+        return struct.unpack_from(byte_order + 'I', tiff, value_offset)[0]
+
+    @staticmethod
+    def __read_tiff_ascii(tiff: memoryview, ifd: dict[int, tuple[int, int, int]], tag: int) -> str:
+        """
+        Reads a null-terminated ASCII value from the given IFD.
+        """
+        _, value_count, value_offset = ifd[tag]
+        return bytes(tiff[value_offset:value_offset + value_count]).split(b'\x00', 1)[0].decode('ascii')
+
+    @staticmethod
+    def __read_tiff_rationals(
+            tiff: memoryview,
+            byte_order: str,
+            ifd: dict[int, tuple[int, int, int]],
+            tag: int) -> tuple[float, float, float]:
+        """
+        Reads the three unsigned rational values of a GPS coordinate from the given IFD.
+        """
+        _, value_count, value_offset = ifd[tag]
+        if value_count != 3:
+            raise ValueError('GPS coordinate does not have 3 values')
+        values = struct.unpack_from(byte_order + 'IIIIII', tiff, value_offset)
+        return values[0] / values[1], values[2] / values[3], values[4] / values[5]
+
+    @staticmethod
+    def __read_exif_tags(image_file: BinaryIO, header: bytes) -> dict:
+        """
+        Reads the EXIF tags from an open image file using exifread, given its already read header.
+        For JPEG images only the header of the file is processed, unless it does not contain the EXIF data.
+        """
+        if header.startswith(ExifReader.JPEG_SOI_MARKER):
+            exif_tags = ExifReader.__process_file(io.BytesIO(header))
+            if any(ExifReader.DATE_TIME_TAG in tag for tag in exif_tags.keys()):
+                return exif_tags
+
+        return ExifReader.__process_file(image_file)
+
+    @staticmethod
+    def __process_file(image_file: BinaryIO) -> dict:
+        """
+        Processes the EXIF tags of the file, stopping after the date time tag.
+        The GPS tags are located in a sub-IFD of the first IFD, so they are processed before it.
+        """
+        try:
+            return exifread.process_file(image_file, details=False, stop_tag=ExifReader.DATE_TIME_TAG)
+        except ExifNotFound:
+            return {}
+
+    @staticmethod
+    def __parse_date_time(date_time_original: str) -> int:
+        """
+        Parses the EXIF date time string into a timestamp, interpreting it as the local time.
+        """
+        # The format is fixed to 'YYYY:MM:DD HH:MM:SS', so the fields are sliced out instead of using strptime
+        date_time = datetime(
+            int(date_time_original[0:4]), int(date_time_original[5:7]), int(date_time_original[8:10]),
+            int(date_time_original[11:13]), int(date_time_original[14:16]), int(date_time_original[17:19]))
+        return int(date_time.timestamp())
+
     @staticmethod
     def __parse_gps_data(exif_data: dict) -> tuple[float | None, float | None]:
         """
@@ -76,7 +268,9 @@ class ExifReader:
         coordinate_values = exif_data[coordinate_tag].values
         assert isinstance(coordinate_values, list), 'GPS coordinate is not a list'
         assert len(coordinate_values) == 3, 'GPS coordinate does not have 3 values'
-        gps_coordinate = (float(coordinate_values[0]), float(coordinate_values[1]), float(coordinate_values[2]))
+        # Values are exifread ratios, dividing their fields directly avoids the generic Fraction to float conversion
+        degrees, minutes, seconds = (value.num / value.den for value in coordinate_values)
+        gps_coordinate = (degrees, minutes, seconds)
         gps_coordinate_ref = exif_data[ref_tag].values
         return ExifReader.__convert_coordinate(gps_coordinate, gps_coordinate_ref)
 
@@ -87,4 +281,4 @@ class ExifReader:
         """
         degrees, minutes, seconds = coordinates
         sign = 1 if ref in ['N', 'E'] else -1
-        return sign * (float(degrees) + float(minutes) / 60 + float(seconds) / 3600)
+        return sign * (degrees + minutes / 60 + seconds / 3600)
@@ -0,0 +1,13 @@
+from enum import IntEnum
+
+
+class FrameAction(IntEnum):
+    """
+    Enum of the ways a single frame can be handled.
+    """
+    # The frame is outside of the daytime range and is not exported
+    SKIP = 0
+    # The frame is exported as is
+    COPY = 1
+    # The frame needs to be decoded, processed and encoded
+    PROCESS = 2
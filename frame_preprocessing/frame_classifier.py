@@ -0,0 +1,61 @@
+import numpy as np
+
+from frame_preprocessing.frame_action import FrameAction
+
+
+class FrameClassifier:
+    """
+    Class that classifies the frames based on their timestamps and the sun events of their days.
+    Works on arrays holding the values of all frames, so that no per-frame arithmetic is left to the workers.
+    """
+    # Codes of the night flags that mark the frames outside of the daylight in their output names
+    NIGHT_FLAG_NONE = 0
+    NIGHT_FLAG_BEFORE_SUNRISE = 1
+    NIGHT_FLAG_AFTER_SUNSET = 2
+
+    @staticmethod
+    def classify_frames(
+            timestamps_s: np.ndarray,
+            sunrises_s: np.ndarray,
+            sunsets_s: np.ndarray,
+            fade_seconds: int,
+            night_margin_seconds: int,
+            process_all_frames: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Classifies the frames given their daylight savings adjusted timestamps and sun events.
+        Kept frames that are not faded are only copied, unless all frames need processing.
+
+        Returns the arrays of:
+        - the FrameAction value of the frame, skipping the frames outside of the earliest to the latest frame range of their day
+        - the fade progress from 0 to 1 for the frames in the fade range, NaN for the frames that are not faded
+        - the night flag code of the frame
+        """
+        # The times of the earliest and the latest frame for the day of each frame
+        earliest_frame_timestamps_s = sunrises_s - night_margin_seconds
+        latest_frame_timestamps_s = sunsets_s + night_margin_seconds
+
+        # How close each frame is to the earliest and the latest frame in seconds
+        seconds_since_earliest_frame = timestamps_s - earliest_frame_timestamps_s
+        seconds_until_latest_frame = latest_frame_timestamps_s - timestamps_s
+
+        keep = (seconds_since_earliest_frame >= 0) & (seconds_until_latest_frame >= 0)
+
+        # The fade progress is taken from the earliest frame if the frame is close to both
+        progress = np.full(len(timestamps_s), np.nan, dtype=np.float32)
+        if fade_seconds > 0:
+            close_to_earliest_frame = keep & (seconds_since_earliest_frame <= fade_seconds)
+            close_to_latest_frame = keep & ~close_to_earliest_frame & (seconds_until_latest_frame <= fade_seconds)
+            progress[close_to_earliest_frame] = seconds_since_earliest_frame[close_to_earliest_frame] / fade_seconds
+            progress[close_to_latest_frame] = seconds_until_latest_frame[close_to_latest_frame] / fade_seconds
+
+        night_flag_codes = np.select(
+            [timestamps_s < sunrises_s, timestamps_s > sunsets_s],
+            [FrameClassifier.NIGHT_FLAG_BEFORE_SUNRISE, FrameClassifier.NIGHT_FLAG_AFTER_SUNSET],
+            FrameClassifier.NIGHT_FLAG_NONE).astype(np.int8)
+
+        actions = np.select(
+            [~keep, ~np.isnan(progress) | process_all_frames],
+            [FrameAction.SKIP, FrameAction.PROCESS],
+            FrameAction.COPY).astype(np.uint8)
+
+        return actions, progress, night_flag_codes
@@ -1,14 +1,45 @@
-import pathlib
+import functools
+import os
+import zoneinfo
+from collections.abc import Iterator
 from concurrent import futures
 
-import pytz
-from exif_reader import ExifReader
+import numpy as np
 from tqdm import tqdm
 
 from frame_preprocessing.datetime_utils import DatetimeUtils
+from frame_preprocessing.exif_reader import ExifReader
+from frame_preprocessing.frame_action import FrameAction
+from frame_preprocessing.frame_classifier import FrameClassifier
 from frame_preprocessing.frame_preprocessor_options import FramePreprocessorOptions
-from frame_preprocessing.image_data import ImageData
+from frame_preprocessing.image_data_table import ImageDataTable
 from frame_preprocessing.single_frame_processor import SingleFrameProcessor
+from frame_preprocessing.sun_events import SunEvents
+
+# Frame processor of the current worker process, created once by the process pool initializer
+_worker_frame_processor: SingleFrameProcessor | None = None
+
+
+def _init_frame_processing_worker(options: FramePreprocessorOptions) -> None:
+    """
+    Initializes a frame processing worker process with its own frame processor.
+    The options are sent to each worker once, and the frame processor caches persist between the frames.
+    """
+    # Frames are already processed in parallel by the worker processes,
+    # so each process uses a single OpenCV thread instead of its own thread pool over all cores
+    import cv2
+    cv2.setNumThreads(1)
+
+    global _worker_frame_processor
+    _worker_frame_processor = SingleFrameProcessor(options)
+
+
+def _process_frame_in_worker(*args) -> None:
+    """
+    Processes a single frame with the frame processor of the current worker process.
+    """
+    assert _worker_frame_processor is not None, 'Frame processing worker is not initialized'
+    _worker_frame_processor.process_frame(*args)
 
 
 class FramePreprocessor:
@@ -18,6 +49,9 @@ class FramePreprocessor:
     It manages the whole process from aggregating the input data and
     loading image data to running the parallel image processing.
     """
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+    # Copying frames is I/O-bound, a few threads saturate the disk without competing with the processing workers
+    MAX_COPY_THREAD_COUNT = 4
 
     def __init__(self, options: FramePreprocessorOptions) -> None:
         self.__options = options
@@ -30,12 +64,30 @@ class FramePreprocessor:
         self.__check_directories()
 
         image_paths = self.__get_image_paths()
-        images_data = self.__get_images_data(image_paths)
+        # The index of each image in the sorted table is used as its id
+        images_data = self.__get_images_data(image_paths).sorted_by_timestamp()
+
+        daylight_savings_shifts_s = self.__get_daylight_savings_shifts(images_data)
+        adjusted_timestamps_s = images_data.timestamps_s + daylight_savings_shifts_s
+        sun_events_keys = list(map(
+            SunEvents.get_key,
+            adjusted_timestamps_s.tolist(),
+            images_data.latitudes.tolist(),
+            images_data.longitudes.tolist()))
+        sun_events = SunEvents.compute_sun_events(sun_events_keys)
+        sunrises_s, sunsets_s = np.array([sun_events[key] for key in sun_events_keys], dtype=np.int64).T
 
-        sorted_image_paths = sorted(image_paths, key=lambda x: images_data[x].timestamp_s)
-        image_ids = {image_path: i for i, image_path in enumerate(sorted_image_paths)}
+        # All frames are classified at once, so that the workers only handle the I/O and the image operations
+        frame_actions, fade_progress, night_flag_codes = FrameClassifier.classify_frames(
+            adjusted_timestamps_s,
+            sunrises_s,
+            sunsets_s,
+            self.__options.fade_seconds,
+            self.__options.night_margin_seconds,
+            self.__options.resize_to_width is not None or self.__options.render_date_and_time)
 
-        self.__run_parallel_image_processing(sorted_image_paths, image_ids, images_data)
+        self.__run_parallel_image_processing(
+            images_data, daylight_savings_shifts_s, frame_actions, fade_progress, night_flag_codes)
 
     def __check_options(self):
         """
@@ -44,7 +96,7 @@ class FramePreprocessor:
         assert len(self.__options.input_dirs) > 0, 'No input directories provided'
         assert len(self.__options.input_dirs) == len(set(self.__options.input_dirs)), 'Duplicate input directories'
 
-        assert self.__options.timezone in pytz.all_timezones, f'Invalid timezone {self.__options.timezone}'
+        assert self.__options.timezone in zoneinfo.available_timezones(), f'Invalid timezone {self.__options.timezone}'
         if self.__options.latitude is not None:
             assert -90 <= self.__options.latitude <= 90, f'Latitude {self.__options.latitude} out of range [-90, 90]'
         if self.__options.longitude is not None:
@@ -67,59 +119,146 @@ class FramePreprocessor:
         for input_dir in self.__options.input_dirs:
             assert input_dir.is_dir(), f'Input directory {input_dir} does not exist'
 
-    def __get_image_paths(self) -> list[pathlib.Path]:
+    def __get_image_paths(self) -> list[str]:
         """
         Returns a list of image paths found in the input directories.
+        The paths are kept as strings, which is what the file operations on them accept.
         """
-        image_paths: list[pathlib.Path] = []
+        image_paths: list[str] = []
         for input_dir in self.__options.input_dirs:
-            image_paths.extend(
-                f for f in input_dir.glob('./**/*.*')
-                if f.suffix.lower() in ['.jpg', '.jpeg', '.png']
-            )
+            image_paths.extend(self.__walk_image_files(input_dir))
 
         assert len(image_paths) > 0, 'No images found in input directories'
+        # The directory listing order is arbitrary, sorting makes the order of the images with equal timestamps,
+        # and with that their ids, the same on every run
+        image_paths.sort()
         return image_paths
 
-    def __get_images_data(self, image_paths: list[pathlib.Path]) -> dict[pathlib.Path, ImageData]:
+    @staticmethod
+    def __walk_image_files(directory: str | os.PathLike) -> Iterator[str]:
+        """
+        Yields the paths of the image files in the directory and all of its subdirectories.
+        Filters the directory entries by name, so that only the images are ever stat-ed or turned into paths.
+        Symbolic links to directories are not followed, so that link cycles cannot make the walk loop.
         """
-        Returns a dictionary of image data objects for each image path.
+        # Directories are walked with an explicit stack instead of recursion, so that the nesting depth is not limited
+        directories_to_walk: list[str | os.PathLike] = [directory]
+        while len(directories_to_walk) > 0:
+            with os.scandir(directories_to_walk.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories_to_walk.append(entry.path)
+                    elif entry.name.lower().endswith(FramePreprocessor.IMAGE_EXTENSIONS) and entry.is_file():
+                        yield entry.path
+
+    def __get_images_data(self, image_paths: list[str]) -> ImageDataTable:
+        """
+        Returns a table with the image data for each image path.
         Checks the image data validity along the way.
         """
-        images_data: dict[pathlib.Path, ImageData] = {}
-        for image_path in tqdm(image_paths, desc='Reading image data'):
-            exif_data = ExifReader.read_exif_data(image_path)
+        # Image GPS data is only needed if the location is not fully provided in the options
+        need_gps = self.__options.latitude is None or self.__options.longitude is None
+        read_exif_data = functools.partial(ExifReader.read_exif_data, need_gps=need_gps)
+
+        # Reading EXIF data is mostly I/O-bound, so the images are read in parallel by threads
+        with futures.ThreadPoolExecutor(max_workers=self.__options.worker_thread_count) as executor:
+            exif_data_list = list(tqdm(
+                executor.map(read_exif_data, image_paths),
+                total=len(image_paths),
+                desc='Reading image data'))
+
+        timestamps_s = np.empty(len(image_paths), dtype=np.int64)
+        latitudes = np.empty(len(image_paths), dtype=np.float64)
+        longitudes = np.empty(len(image_paths), dtype=np.float64)
+        for i, (image_path, exif_data) in enumerate(zip(image_paths, exif_data_list)):
             assert exif_data.timestamp_s is not None, f'No timestamp found for {image_path}'
             assert exif_data.latitude is not None or self.__options.latitude is not None, f'No latitude found for {image_path}'
             assert exif_data.longitude is not None or self.__options.longitude is not None, f'No longitude found for {image_path}'
-            images_data[image_path] = ImageData(
-                timestamp_s=exif_data.timestamp_s,
-                latitude=exif_data.latitude if exif_data.latitude is not None else self.__options.latitude,
-                longitude=exif_data.longitude if exif_data.longitude is not None else self.__options.longitude)
+            timestamps_s[i] = exif_data.timestamp_s
+            latitudes[i] = exif_data.latitude if exif_data.latitude is not None else self.__options.latitude
+            longitudes[i] = exif_data.longitude if exif_data.longitude is not None else self.__options.longitude
 
-        return images_data
+        return ImageDataTable(
+            paths=image_paths,
+            timestamps_s=timestamps_s,
+            latitudes=latitudes,
+            longitudes=longitudes)
+
+    def __get_daylight_savings_shifts(self, images_data: ImageDataTable) -> np.ndarray:
+        """
+        Daylight savings time may switch during the time-lapse and the camera may not
+        adjust for it. Returns the array of shifts in seconds that adjust each image
+        timestamp to account for the daylight savings switch if the option is enabled.
+        """
+        if not self.__options.ignore_daylight_savings_switch:
+            return np.zeros(len(images_data), dtype=np.int64)
+
+        daylight_savings_flags = DatetimeUtils.get_daylight_savings_flags(
+            images_data.timestamps_s, self.__options.timezone)
+        is_first_frame_in_daylight_savings = daylight_savings_flags[0]
+
+        # Frames with a different daylight savings status than the first frame are shifted by an hour towards it
+        shift_s = -60 * 60 if is_first_frame_in_daylight_savings else 60 * 60
+        return np.where(daylight_savings_flags != is_first_frame_in_daylight_savings, shift_s, 0).astype(np.int64)
 
     def __run_parallel_image_processing(
             self,
-            sorted_image_paths: list[pathlib.Path],
-            image_ids: dict[pathlib.Path, int],
-            images_data: dict[pathlib.Path, ImageData]) -> None:
+            images_data: ImageDataTable,
+            daylight_savings_shifts_s: np.ndarray,
+            frame_actions: np.ndarray,
+            fade_progress: np.ndarray,
+            night_flag_codes: np.ndarray) -> None:
         """
-        Runs the parallel image processing on the aggregated images.
+        Runs the parallel image processing on the aggregated images, sorted by their timestamps.
         """
-        is_first_frame_in_daylight_savings = DatetimeUtils.is_in_daylight_savings(
-            images_data[sorted_image_paths[0]].timestamp_s,
-            self.__options.timezone)
-        single_frame_processor = SingleFrameProcessor(self.__options, is_first_frame_in_daylight_savings)
+        single_frame_processor = SingleFrameProcessor(self.__options)
 
-        with futures.ThreadPoolExecutor(max_workers=self.__options.worker_thread_count) as executor:
+        # Plain Python values are passed to the frame processor, instead of numpy scalars
+        frame_shifts_s = daylight_savings_shifts_s.tolist()
+        frame_night_flag_codes = night_flag_codes.tolist()
+        frame_fade_progress = [None if np.isnan(progress) else progress for progress in fade_progress.tolist()]
+        processed_image_ids = np.flatnonzero(frame_actions == FrameAction.PROCESS).tolist()
+        copied_image_ids = np.flatnonzero(frame_actions == FrameAction.COPY).tolist()
+
+        # Create the output subfolders once up front, instead of checking for them with every frame
+        # The output directory is checked to not exist, so each directory is created with a single call
+        subfolder_paths = {
+            single_frame_processor.get_output_subfolder_path(image_id)
+            for image_id in processed_image_ids + copied_image_ids
+        }
+        self.__options.output_dir.mkdir(parents=True)
+        for subfolder_path in sorted(subfolder_paths):
+            os.mkdir(subfolder_path)
+
+        # Decoding and encoding frames is CPU-bound, so it is done in processes,
+        # while the frames that are only copied are handled by a few threads
+        with futures.ProcessPoolExecutor(
+                max_workers=self.__options.worker_thread_count,
+                initializer=_init_frame_processing_worker,
+                initargs=(self.__options,)) as process_executor, \
+                futures.ThreadPoolExecutor(
+                    max_workers=min(self.__options.worker_thread_count, self.MAX_COPY_THREAD_COUNT)) as copy_executor:
+            # Processes are submitted first, so that the worker processes are forked before any threads are started
             futures_list = [
-                executor.submit(
-                    single_frame_processor.process_frame,
-                    image_path,
-                    image_ids[image_path],
-                    images_data[image_path])
-                for image_path in sorted_image_paths
+                process_executor.submit(
+                    _process_frame_in_worker,
+                    images_data.paths[image_id],
+                    image_id,
+                    images_data.get_image_data(image_id),
+                    frame_shifts_s[image_id],
+                    frame_night_flag_codes[image_id],
+                    frame_fade_progress[image_id])
+                for image_id in processed_image_ids
             ]
+            futures_list.extend(
+                copy_executor.submit(
+                    single_frame_processor.copy_frame,
+                    images_data.paths[image_id],
+                    image_id,
+                    images_data.get_image_data(image_id),
+                    frame_shifts_s[image_id],
+                    frame_night_flag_codes[image_id])
+                for image_id in copied_image_ids
+            )
             for future in tqdm(futures.as_completed(futures_list), total=len(futures_list), desc='Processing images'):
                 future.result()
@@ -2,7 +2,7 @@ import pathlib
 from dataclasses import dataclass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class FramePreprocessorOptions:
     """
     Struct that contains the options for the frame preprocessor.
@@ -24,6 +24,7 @@ class FramePreprocessorOptions:
     # Other options
     ignore_daylight_savings_switch: bool
     render_date_and_time: bool
+    hardlink_copied_frames: bool
 
     # Execution options
     worker_thread_count: int
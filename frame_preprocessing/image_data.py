@@ -1,11 +1,14 @@
 from dataclasses import dataclass
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class ImageData:
     """
     Struct that contains the metadata of an image.
     Requires all fields to be present.
+
+    Not frozen, as one is created for every frame and frozen construction is slower,
+    but it is treated as immutable.
     """
     timestamp_s: int
     latitude: float
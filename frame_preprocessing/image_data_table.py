@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from frame_preprocessing.image_data import ImageData
+
+
+@dataclass(frozen=True)
+class ImageDataTable:
+    """
+    Struct of arrays that contains the metadata of all images.
+    The values at index i of each array belong to the image at paths[i].
+    Requires all fields to be present.
+    """
+    paths: list[str]
+    timestamps_s: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def get_image_data(self, index: int) -> ImageData:
+        """
+        Get the metadata of the image at the given index.
+        """
+        return ImageData(
+            timestamp_s=int(self.timestamps_s[index]),
+            latitude=float(self.latitudes[index]),
+            longitude=float(self.longitudes[index]))
+
+    def sorted_by_timestamp(self) -> 'ImageDataTable':
+        """
+        Get a copy of the table sorted by the image timestamps.
+        Images with equal timestamps keep their relative order.
+        """
+        order = np.argsort(self.timestamps_s, kind='stable')
+        return ImageDataTable(
+            paths=[self.paths[i] for i in order.tolist()],
+            timestamps_s=self.timestamps_s[order],
+            latitudes=self.latitudes[order],
+            longitudes=self.longitudes[order])
@@ -1,12 +1,13 @@
-import pathlib
+import errno
+import functools
+import os
 import shutil
-from datetime import date, datetime
+import time
+import types
 
-import cv2
 import numpy as np
-from suntimes import SunTimes
 
-from frame_preprocessing.datetime_utils import DatetimeUtils
+from frame_preprocessing.frame_classifier import FrameClassifier
 from frame_preprocessing.frame_preprocessor_options import FramePreprocessorOptions
 from frame_preprocessing.image_data import ImageData
 
@@ -16,128 +17,212 @@ class SingleFrameProcessor:
     The class that handles the low-level logic of processing a single frame.
     """
     MAX_IMAGES_PER_FOLDER = 500
-
-    def __init__(
+    # JPEG images can be decoded directly at these fractions of their size, largest reduction first
+    JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+    JPEG_REDUCED_READ_SCALES = (8, 4, 2)
+
+    def __init__(self, options: FramePreprocessorOptions) -> None:
+        # The used options are unpacked into attributes once, instead of being looked up through the options per frame
+        self.__resize_to_width = options.resize_to_width
+        self.__render_date_and_time = options.render_date_and_time
+        self.__hardlink_copied_frames = options.hardlink_copied_frames
+        self.__fade_seconds = options.fade_seconds
+        self.__inverse_fade_seconds = 1 / options.fade_seconds if options.fade_seconds > 0 else 0.0
+        # Output paths are built as strings, which avoids creating path objects for every frame
+        self.__output_dir_str = os.fspath(options.output_dir)
+        # Height and width of the last image read at full size, used to pick the reduced read scale
+        self.__source_image_size: tuple[int, int] | None = None
+        # Output buffer of the resize, reused by the following frames of the same size
+        self.__resize_buffer: np.ndarray | None = None
+        # Fade lookup tables by the fade progress in whole seconds, shared by the frames with the same progress
+        self.__fade_luts: dict[int, np.ndarray] = {}
+
+    def copy_frame(
             self,
-            options: FramePreprocessorOptions,
-            is_first_frame_in_daylight_savings: bool) -> None:
-        self.__options = options
-        self.__is_first_frame_in_daylight_savings = is_first_frame_in_daylight_savings
+            image_path: str,
+            image_id: int,
+            image_data: ImageData,
+            daylight_savings_shift_s: int,
+            night_flag_code: int) -> None:
+        """
+        Saves a frame that does not need any processing, by copying the image file, or hard linking it if enabled.
+        The daylight savings shift is added to the image timestamp to account for the switch, if enabled.
+        """
+        new_image_path = self.__generate_output_image_path(
+            image_id, image_data.timestamp_s + daylight_savings_shift_s, night_flag_code, image_data.timestamp_s)
+
+        if self.__hardlink_copied_frames:
+            try:
+                os.link(image_path, new_image_path)
+                return
+            except OSError as error:
+                # Raised if the input and output directories are on different filesystems,
+                # or the filesystem does not support hard links, any other error is a real one
+                if error.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.EMLINK):
+                    raise
+
+        self.__copy_file_contents(image_path, new_image_path)
 
     def process_frame(
             self,
-            image_path: pathlib.Path,
+            image_path: str,
             image_id: int,
-            image_data: ImageData) -> None:
+            image_data: ImageData,
+            daylight_savings_shift_s: int,
+            night_flag_code: int,
+            fade_progress: float | None) -> None:
         """
-        Executes the processing of a single frame and saves the output image.
+        Executes the processing of a single frame that needs it and saves the output image.
+        The daylight savings shift is added to the image timestamp to account for the switch, if enabled.
+        The fade progress is None if the frame is not in the fade range.
         """
-        adjusted_timestamp_s = self.__get_daylight_savings_adjusted_timestamp(image_data.timestamp_s)
-        sunrise, sunset = self.__get_sunrise_sunset(
-            adjusted_timestamp_s, self.__options.latitude, self.__options.longitude)
-
-        # The times of the earliest and the latest frame for the current day
-        earliest_frame_timestamp_s = sunrise.timestamp() - self.__options.night_margin_seconds
-        latest_frame_timestamp_s = sunset.timestamp() + self.__options.night_margin_seconds
-
-        # How close the current frame is to the earliest and the latest frame in seconds
-        seconds_since_earliest_frame = adjusted_timestamp_s - earliest_frame_timestamp_s
-        seconds_until_latest_frame = latest_frame_timestamp_s - adjusted_timestamp_s
+        # Get output image path, the parent directories are created before the processing starts
+        new_image_path = self.__generate_output_image_path(
+            image_id, image_data.timestamp_s + daylight_savings_shift_s, night_flag_code, image_data.timestamp_s)
+
+        # Names used throughout the function are bound to locals once
+        cv2 = SingleFrameProcessor.__get_cv2()
+        resize_to_width = self.__resize_to_width
+
+        image, (height, width) = self.__read_image(cv2, image_path)
+
+        if resize_to_width is not None:
+            # Resize the image to the specified width, with the height computed from the source image size
+            new_height = int(resize_to_width / width * height)
+            resized_shape = (new_height, resize_to_width) + image.shape[2:]
+            resize_buffer = self.__resize_buffer
+            if resize_buffer is None or resize_buffer.shape != resized_shape or resize_buffer.dtype != image.dtype:
+                resize_buffer = np.empty(resized_shape, dtype=image.dtype)
+                self.__resize_buffer = resize_buffer
+            # All of the following operations are done in place, so the frame is processed within the buffer
+            image = cv2.resize(image, (resize_to_width, new_height), dst=resize_buffer)
+
+        if self.__render_date_and_time:
+            # Render the date and time on the frame
+            time_struct = time.localtime(image_data.timestamp_s)
+            date_time_str = (
+                f'{time_struct.tm_year:04d}-{time_struct.tm_mon:02d}-{time_struct.tm_mday:02d} '
+                f'{time_struct.tm_hour:02d}:{time_struct.tm_min:02d}'
+            )
+            scale_coefficient = image.shape[1] / 1500.0
+            # Draw a semi-transparent black rectangle to make the text more readable
+            rectangle_width = int(345 * scale_coefficient)
+            rectangle_height = int(40 * scale_coefficient)
+            # Halved in place through the view of the image, without a temporary copy of the region
+            rectangle = image[0:rectangle_height, 0:rectangle_width]
+            np.right_shift(rectangle, 1, out=rectangle)
+            cv2.putText(
+                img=image,
+                text=date_time_str,
+                org=(int(10 * scale_coefficient), int(30 * scale_coefficient)),
+                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                fontScale=scale_coefficient,
+                color=(255, 255, 255),
+                thickness=int(2 * scale_coefficient))
+
+        if fade_progress is not None:
+            # Apply the fade effect to the frame
+            assert 0 <= fade_progress <= 1, f'Invalid progress value {fade_progress}'
+
+            # Maps every pixel value through a precomputed table in a single pass, in place, without a floating point copy
+            cv2.LUT(image, self.__get_fade_lut(fade_progress), dst=image)
+
+        cv2.imwrite(new_image_path, image)
+
+    def __read_image(self, cv2: types.ModuleType, image_path: str) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Reads the image, and returns it along with the height and width of the source image.
 
-        # If the current frame is outside the range of the earliest and the latest frame, skip it
-        if seconds_since_earliest_frame < 0 or seconds_until_latest_frame < 0:
-            return
+        If the image is resized to a smaller width anyway, JPEG images are decoded directly at a reduced scale
+        that still covers the target width, which skips most of the decoding work.
+        The scale is chosen based on the previous image size, as the images of a time-lapse are usually the same size.
+        """
+        resize_to_width = self.__resize_to_width
+        if resize_to_width is not None and self.__source_image_size is not None and \
+                image_path.lower().endswith(self.JPEG_EXTENSIONS):
+            source_height, source_width = self.__source_image_size
+            for scale in self.JPEG_REDUCED_READ_SCALES:
+                # Reduced JPEG decoding rounds the size up
+                reduced_size = (-(-source_height // scale), -(-source_width // scale))
+                if reduced_size[1] < resize_to_width:
+                    continue
+                image = cv2.imread(image_path, getattr(cv2, f'IMREAD_REDUCED_COLOR_{scale}'))
+                # A different size means that the source size changed, in which case the image is read again at full size
+                if image is not None and image.shape[:2] == reduced_size:
+                    return image, self.__source_image_size
+                break
+
+        image = cv2.imread(image_path)
+        self.__source_image_size = image.shape[:2]
+        return image, self.__source_image_size
+
+    def __get_fade_lut(self, fade_progress: float) -> np.ndarray:
+        """
+        Get the lookup table that applies the fade effect for the given fade progress to all 256 pixel values.
+        """
+        # The progress is a whole number of seconds in the fade range, so the bucket identifies it exactly
+        fade_bucket = round(fade_progress * self.__fade_seconds)
+        fade_luts = self.__fade_luts
+        fade_lut = fade_luts.get(fade_bucket)
+        if fade_lut is None:
+            fade_factor = 1 / (1 + np.exp(-10 * (fade_bucket * self.__inverse_fade_seconds - 0.5)))
+            fade_lut = np.clip(np.arange(256) * fade_factor, 0, 255).astype(np.uint8)
+            fade_luts[fade_bucket] = fade_lut
+
+        return fade_lut
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __get_cv2() -> types.ModuleType:
+        """
+        Get the OpenCV module, imported on the first frame that needs processing.
+        Loading OpenCV is expensive, and the processes and threads that only copy frames never need it.
+        """
+        import cv2
+        return cv2
 
-        # Check if the current frame is in the fade range of the earliest or the latest frame
-        close_to_earliest_frame = 0 <= seconds_since_earliest_frame <= self.__options.fade_seconds
-        close_to_latest_frame = 0 <= seconds_until_latest_frame <= self.__options.fade_seconds
+    @staticmethod
+    def __copy_file_contents(source_path: str, destination_path: str) -> None:
+        """
+        Copies the contents of the file, without the permission bits, as the output file is newly created.
 
-        # Get output image path and create the parent directories if needed
-        new_image_path = self.__generate_output_image_path(
-            image_id, adjusted_timestamp_s, sunrise, sunset, image_data.timestamp_s)
-        new_image_path.parent.mkdir(parents=True, exist_ok=True)
-
-        processing_needed = close_to_earliest_frame or close_to_latest_frame or \
-            self.__options.resize_to_width is not None or self.__options.render_date_and_time
-
-        if processing_needed:
-            # Some processing of the frame is needed
-            image = cv2.imread(str(image_path))
-
-            if self.__options.resize_to_width is not None:
-                # Resize the image to the specified width
-                height, width = image.shape[:2]
-                new_height = int(self.__options.resize_to_width / width * height)
-                image = cv2.resize(image, (self.__options.resize_to_width, new_height))
-
-            if self.__options.render_date_and_time:
-                # Render the date and time on the frame
-                date_time_str = datetime.fromtimestamp(image_data.timestamp_s).strftime('%Y-%m-%d %H:%M')
-                scale_coefficient = image.shape[1] / 1500.0
-                # Draw a semi-transparent black rectangle to make the text more readable
-                rectangle_width = int(345 * scale_coefficient)
-                rectangle_height = int(40 * scale_coefficient)
-                image[0:rectangle_height, 0:rectangle_width] = image[0:rectangle_height, 0:rectangle_width] // 2
-                cv2.putText(
-                    img=image,
-                    text=date_time_str,
-                    org=(int(10 * scale_coefficient), int(30 * scale_coefficient)),
-                    fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                    fontScale=scale_coefficient,
-                    color=(255, 255, 255),
-                    thickness=int(2 * scale_coefficient))
-
-            if close_to_earliest_frame or close_to_latest_frame:
-                # Apply the fade effect to the frame
-                if close_to_earliest_frame:
-                    progress = seconds_since_earliest_frame / self.__options.fade_seconds
-                else:
-                    progress = seconds_until_latest_frame / self.__options.fade_seconds
-                assert 0 <= progress <= 1, f'Invalid progress value {progress}'
-
-                fade_factor = 1 / (1 + np.exp(-10 * (progress - 0.5)))
-                image = (image * fade_factor).astype('uint8')
-
-            cv2.imwrite(str(new_image_path), image)
-        else:
-            # No processing needed, just copy the image
-            shutil.copy(image_path, new_image_path)
-
-    def __get_daylight_savings_adjusted_timestamp(self, timestamp_s: int) -> int:
-        """
-        Daylight savings time may switch during the time-lapse and the camera may not
-        adjust for it. This method adjusts the timestamp to account for the daylight
-        savings switch if the option is enabled.
-        """
-        adjusted_timestamp_s = timestamp_s
-        if self.__options.ignore_daylight_savings_switch:
-            is_frame_in_daylight_savings = DatetimeUtils.is_in_daylight_savings(
-                adjusted_timestamp_s, self.__options.timezone)
-            if self.__is_first_frame_in_daylight_savings and not is_frame_in_daylight_savings:
-                adjusted_timestamp_s -= 60 * 60
-            elif not self.__is_first_frame_in_daylight_savings and is_frame_in_daylight_savings:
-                adjusted_timestamp_s += 60 * 60
-
-        return adjusted_timestamp_s
-
-    def __get_sunrise_sunset(self, timestamp_s: int, latitude: float, longitude: float) -> tuple[datetime, datetime]:
-        """
-        Get the sunrise and sunset datetime objects for the day of the given
-        timestamp and the given timelapse geo-location.
-        """
-        sun = SunTimes(longitude=longitude, latitude=latitude, altitude=0)
-        sunrise = sun.risewhere(date.fromtimestamp(timestamp_s), self.__options.timezone)
-        sunset = sun.setwhere(date.fromtimestamp(timestamp_s), self.__options.timezone)
-
-        return sunrise, sunset
+        Where available, copy_file_range lets the kernel copy the data without passing it through user space,
+        or share the data blocks on copy-on-write filesystems. Otherwise falls back to shutil.copyfile.
+        """
+        if hasattr(os, 'copy_file_range'):
+            try:
+                with open(source_path, 'rb') as source_file, open(destination_path, 'wb') as destination_file:
+                    source_fd = source_file.fileno()
+                    destination_fd = destination_file.fileno()
+                    copy_file_range = os.copy_file_range
+                    remaining_bytes = os.fstat(source_fd).st_size
+                    while remaining_bytes > 0:
+                        copied_bytes = copy_file_range(source_fd, destination_fd, remaining_bytes)
+                        if copied_bytes == 0:
+                            # Some filesystems report no progress instead of an error, the regular copy overwrites the output
+                            raise OSError(errno.ENOSYS, 'copy_file_range made no progress', source_path)
+                        remaining_bytes -= copied_bytes
+                return
+            except OSError as error:
+                # Raised if the kernel or the filesystems do not support the call, any other error is a real one
+                if error.errno not in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+
+        shutil.copyfile(source_path, destination_path)
+
+    def get_output_subfolder_path(self, image_id: int) -> str:
+        """
+        Get the path of the output subfolder for the image with the given id.
+        """
+        # Create subfolders with up to 500 images each to avoid having too many files in one directory
+        return f'{self.__output_dir_str}{os.sep}{image_id // self.MAX_IMAGES_PER_FOLDER:03d}'
 
     def __generate_output_image_path(
             self,
             image_id: int,
             frame_timestamp_s: int,
-            sunrise: datetime,
-            sunset: datetime,
-            non_adjusted_timestamp_s: int) -> pathlib.Path:
+            night_flag_code: int,
+            non_adjusted_timestamp_s: int) -> str:
         """
         Generate the path for the output image file based on the given parameters.
 
@@ -147,28 +232,18 @@ class SingleFrameProcessor:
         - _d if the frame has a different daylight savings status than the first frame
         """
         image_id_str = f'{image_id:010d}'
-        image_time_str = datetime.fromtimestamp(frame_timestamp_s).strftime('%Y_%m_%d_%H_%M_%S')
-        before_sunrise_flag = '_b' if self.__is_before_sunrise(frame_timestamp_s, sunrise) else ''
-        after_sunset_flag = '_a' if self.__is_after_sunset(frame_timestamp_s, sunset) else ''
+        # Equivalent to formatting with datetime.strftime, without the datetime object and the format string parsing
+        time_struct = time.localtime(frame_timestamp_s)
+        image_time_str = (
+            f'{time_struct.tm_year:04d}_{time_struct.tm_mon:02d}_{time_struct.tm_mday:02d}_'
+            f'{time_struct.tm_hour:02d}_{time_struct.tm_min:02d}_{time_struct.tm_sec:02d}'
+        )
+        before_sunrise_flag = '_b' if night_flag_code == FrameClassifier.NIGHT_FLAG_BEFORE_SUNRISE else ''
+        after_sunset_flag = '_a' if night_flag_code == FrameClassifier.NIGHT_FLAG_AFTER_SUNSET else ''
         daylight_savings_flag = '_d' if frame_timestamp_s != non_adjusted_timestamp_s else ''
 
         new_image_name = (
             f'{image_id_str}_{image_time_str}'
             f'{before_sunrise_flag}{after_sunset_flag}{daylight_savings_flag}.jpg'
         )
-        # Create subfolders with up to 500 images each to avoid having too many files in one directory
-        subfolder_path = self.__options.output_dir / f'{image_id // self.MAX_IMAGES_PER_FOLDER:03d}'
-
-        return subfolder_path / new_image_name
-
-    def __is_before_sunrise(self, timestamp_s: int, sunrise: datetime) -> bool:
-        """
-        Check if the given timestamp is before the sunrise.
-        """
-        return timestamp_s - sunrise.timestamp() < 0
-
-    def __is_after_sunset(self, timestamp_s: int, sunset: datetime) -> bool:
-        """
-        Check if the given timestamp is after the sunset.
-        """
-        return sunset.timestamp() - timestamp_s < 0
+        return f'{self.get_output_subfolder_path(image_id)}{os.sep}{new_image_name}'
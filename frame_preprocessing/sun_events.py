@@ -0,0 +1,100 @@
+from collections.abc import Iterable
+from datetime import date
+
+import numpy as np
+
+# Day ordinal, latitude and longitude
+SunEventsKey = tuple[int, float, float]
+
+
+class SunEvents:
+    """
+    Class that computes the sunrise and sunset times for the days of the time-lapse.
+
+    Sun events only change per date and location, so they are computed once
+    for each unique key instead of once per frame, all keys in a single vectorized pass.
+    The computation follows the sunrise equation, as previously used through the suntimes package.
+    """
+    # Coordinates are rounded to roughly 10m, so that GPS noise does not produce distinct keys
+    COORDINATE_DECIMALS = 4
+
+    # Julian day at noon of the day with the proleptic Gregorian ordinal 0, and the Julian day of the Unix epoch
+    JULIAN_DAY_ORDINAL_OFFSET = 1721425
+    JULIAN_DAY_UNIX_EPOCH = 2440587.5
+    # Julian day of the J2000 epoch, and the leap seconds correction in days
+    JULIAN_DAY_2000 = 2451545.0
+    JULIAN_DAY_LEAP = 0.00084
+
+    # Solar mean anomaly, equation of the center and the argument of the perihelion, in degrees
+    MEAN_ANOMALY_0 = 357.5291
+    MEAN_ANOMALY_1 = 0.98560028
+    CENTER_0 = 1.9148
+    CENTER_1 = 0.0200
+    CENTER_2 = 0.0003
+    PERIHELION_ARGUMENT = 102.9372
+    # Solar transit equation coefficients, in days
+    TRANSIT_0 = 0.0053
+    TRANSIT_1 = 0.0069
+    # Obliquity of the ecliptic and the sun elevation at sunrise and sunset accounting for refraction, in degrees
+    OBLIQUITY = 23.44
+    SUNRISE_ELEVATION = -0.833
+
+    @staticmethod
+    def get_key(timestamp_s: int, latitude: float, longitude: float) -> SunEventsKey:
+        """
+        Get the sun events lookup key for the day of the given timestamp and the given geo-location.
+        """
+        return (
+            date.fromtimestamp(timestamp_s).toordinal(),
+            round(latitude, SunEvents.COORDINATE_DECIMALS),
+            round(longitude, SunEvents.COORDINATE_DECIMALS))
+
+    @staticmethod
+    def compute_sun_events(keys: Iterable[SunEventsKey]) -> dict[SunEventsKey, tuple[int, int]]:
+        """
+        Compute the sunrise and sunset timestamps for each of the unique keys, in whole seconds.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        if len(unique_keys) == 0:
+            return {}
+
+        day_ordinals, latitudes, longitudes = (np.array(values) for values in zip(*unique_keys))
+        sunrises_s, sunsets_s = SunEvents.__compute_sun_events_arrays(day_ordinals, latitudes, longitudes)
+        return dict(zip(unique_keys, zip(sunrises_s.tolist(), sunsets_s.tolist())))
+
+    @staticmethod
+    def __compute_sun_events_arrays(
+            day_ordinals: np.ndarray,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the sunrise and sunset timestamps for the given arrays of days and geo-locations.
+        """
+        # Mean solar time of the day at the location, in days since the J2000 epoch
+        mean_solar_noon = \
+            day_ordinals + SunEvents.JULIAN_DAY_ORDINAL_OFFSET - SunEvents.JULIAN_DAY_2000 + SunEvents.JULIAN_DAY_LEAP - \
+            longitudes / 360
+        mean_anomaly = np.radians((SunEvents.MEAN_ANOMALY_0 + SunEvents.MEAN_ANOMALY_1 * mean_solar_noon) % 360)
+        equation_of_center = \
+            SunEvents.CENTER_0 * np.sin(mean_anomaly) + \
+            SunEvents.CENTER_1 * np.sin(2 * mean_anomaly) + \
+            SunEvents.CENTER_2 * np.sin(3 * mean_anomaly)
+        ecliptic_longitude = np.radians(
+            (np.degrees(mean_anomaly) + equation_of_center + 180 + SunEvents.PERIHELION_ARGUMENT) % 360)
+        solar_transit = \
+            SunEvents.JULIAN_DAY_2000 + mean_solar_noon + \
+            SunEvents.TRANSIT_0 * np.sin(mean_anomaly) - SunEvents.TRANSIT_1 * np.sin(2 * ecliptic_longitude)
+
+        declination = np.arcsin(np.sin(ecliptic_longitude) * np.sin(np.radians(SunEvents.OBLIQUITY)))
+        latitudes_rad = np.radians(latitudes)
+        cos_hour_angle = \
+            (np.sin(np.radians(SunEvents.SUNRISE_ELEVATION)) - np.sin(latitudes_rad) * np.sin(declination)) / \
+            (np.cos(latitudes_rad) * np.cos(declination))
+        # Beyond the polar circles the sun may not rise or set, in which case the cosine is out of range.
+        # Clipping it makes the sunrise equal the sunset on a polar night, and spans the whole day on a polar day
+        hour_angle_days = np.degrees(np.arccos(np.clip(cos_hour_angle, -1, 1))) / 360
+
+        # Rounded to whole minutes, as the precision of the equation does not go beyond that
+        sunrises_minutes = np.round((solar_transit - hour_angle_days - SunEvents.JULIAN_DAY_UNIX_EPOCH) * 24 * 60)
+        sunsets_minutes = np.round((solar_transit + hour_angle_days - SunEvents.JULIAN_DAY_UNIX_EPOCH) * 24 * 60)
+        return sunrises_minutes.astype(np.int64) * 60, sunsets_minutes.astype(np.int64) * 60